@@ -1,10 +1,102 @@
+import hashlib
 import json
 import os
+import tempfile
 
 TRANSCODE_CACHE_DIR = "/var/tmp" if os.path.isdir("/var/tmp") else "/tmp"
 TRANSCODE_CACHE_MP4 = os.path.join(TRANSCODE_CACHE_DIR, "gnomecast_transcode_cache.mp4")
 TRANSCODE_CACHE_JSON = os.path.join(TRANSCODE_CACHE_DIR, "gnomecast_transcode_cache.json")
 
+PROBE_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "gnomecast",
+    "probe",
+)
+PROBE_CACHE_BUDGET = 64 * 1024 * 1024
+
+
+def probe_cache_key(source_path):
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return None
+    raw = "%s|%s|%s" % (os.path.abspath(source_path), stat.st_mtime_ns, stat.st_size)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def probe_thumbnail_path(key):
+    return os.path.join(PROBE_CACHE_DIR, "%s.jpg" % key)
+
+
+def read_probe_cache(key):
+    try:
+        with open(os.path.join(PROBE_CACHE_DIR, "%s.json" % key)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_probe_cache(key, data):
+    os.makedirs(PROBE_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PROBE_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(PROBE_CACHE_DIR, "%s.json" % key))
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _remove_probe_entry(key):
+    paths = (
+        os.path.join(PROBE_CACHE_DIR, "%s.json" % key),
+        probe_thumbnail_path(key),
+    )
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def prune_probe_cache():
+    try:
+        entries = os.listdir(PROBE_CACHE_DIR)
+    except OSError:
+        return
+    kept = []
+    for entry in entries:
+        if not entry.endswith(".json"):
+            continue
+        key = entry[: -len(".json")]
+        data = read_probe_cache(key)
+        if not data or not os.path.isfile(data.get("source_path", "")):
+            _remove_probe_entry(key)
+            continue
+        size = 0
+        mtime = 0
+        for path in (
+            os.path.join(PROBE_CACHE_DIR, entry),
+            probe_thumbnail_path(key),
+        ):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            size += stat.st_size
+            mtime = max(mtime, stat.st_mtime)
+        kept.append((mtime, size, key))
+    # Evict oldest entries once the cache grows past its budget.
+    total = sum(size for _, size, _ in kept)
+    for mtime, size, key in sorted(kept):
+        if total <= PROBE_CACHE_BUDGET:
+            break
+        _remove_probe_entry(key)
+        total -= size
+
 
 def read_transcode_cache():
     try:
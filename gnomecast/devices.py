@@ -1,49 +1,79 @@
-from dataclasses import dataclass
+import sys
+from functools import lru_cache
+from typing import NamedTuple
 
 
-@dataclass(frozen=True, kw_only=True)
-class Device:
+class Device(NamedTuple):
     manufacturer: str
     model_name: str
     h265: bool
     ac3: bool
 
 
-_devices = {
+_DEVICES: tuple[Device, ...] = (
     Device(
-        manufacturer="Unknown manufacturer",
-        model_name="Chromecast",
+        manufacturer=sys.intern("Unknown manufacturer"),
+        model_name=sys.intern("Chromecast"),
         h265=False,
         ac3=False,
     ),
     Device(
-        manufacturer="Unknown manufacturer",
-        model_name="Chromecast Ultra",
+        manufacturer=sys.intern("Unknown manufacturer"),
+        model_name=sys.intern("Chromecast Ultra"),
         h265=True,
         ac3=True,
     ),
     Device(
-        manufacturer="Unknown manufacturer",
-        model_name="Google Home Mini",
+        manufacturer=sys.intern("Unknown manufacturer"),
+        model_name=sys.intern("Google Home Mini"),
         h265=False,
         ac3=False,
     ),
     Device(
-        manufacturer="VIZIO",
-        model_name="P75-F1",
+        manufacturer=sys.intern("VIZIO"),
+        model_name=sys.intern("P75-F1"),
         h265=True,
         ac3=True,
     ),
+)
+
+
+_DEVICES_BY_KEY: dict[tuple[str, str], Device] = {
+    (device.manufacturer, device.model_name): device for device in _DEVICES
 }
 
+_DEVICES_BY_MANUFACTURER: dict[str, dict[str, Device]] = {}
+for _device in _DEVICES:
+    _DEVICES_BY_MANUFACTURER.setdefault(_device.manufacturer, {})[
+        _device.model_name
+    ] = _device
+
+DEFAULT_DEVICE = Device(
+    manufacturer="Unknown manufacturer", model_name="Default", h265=False, ac3=False
+)
+
+_lookup_device = _DEVICES_BY_KEY.get
+
+
+def models_for(manufacturer: str) -> list[str]:
+    """
+    List the known model names for a manufacturer.
+    """
+    return list(_DEVICES_BY_MANUFACTURER.get(manufacturer, {}))
+
+
+def devices_with(*, h265: bool, ac3: bool) -> list[Device]:
+    """
+    List the known devices matching the given capabilities.
+    """
+    return [
+        device for device in _DEVICES if device.h265 == h265 and device.ac3 == ac3
+    ]
+
 
-def get_device(manufacturer: str, model_name: str) -> Device:
+@lru_cache(maxsize=None)
+def get_device(manufacturer: str, model_name: str) -> Device | None:
     """
-    Get a device by its manufacturer and model name.
+    Get a device by its manufacturer and model name, or None if unknown.
     """
-    for device in _devices:
-        if device.manufacturer == manufacturer and device.model_name == model_name:
-            return device
-    return Device(
-        manufacturer="Unknown manufacturer", model_name="Default", h265=False, ac3=False
-    )
+    return _lookup_device((sys.intern(manufacturer), sys.intern(model_name)))
@@ -1,6 +1,8 @@
 import os
+import shutil
 import subprocess
 import tempfile
+from functools import cache
 from pathlib import Path
 
 from gnomecast.utils import get_tempfile_prefix
@@ -9,16 +11,13 @@ from gnomecast.utils import get_tempfile_prefix
 def parse_ffmpeg_time(time_s: str) -> float | None:
     if time_s == "N/A":
         return None
-    hours, minutes, seconds = (float(s) for s in time_s.split(":"))
-    return hours * 60 * 60 + minutes * 60 + seconds
+    hours, minutes, seconds = time_s.split(":", 2)
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
 
+@cache
 def check_ffmpeg_installed() -> bool:
-    try:
-        subprocess.run(["ffmpeg", "-version"], check=True, stdout=subprocess.DEVNULL)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+    return shutil.which("ffmpeg") is not None
 
 
 def extract_thumbnail(file_path: Path, offset: int = 30) -> Path:
@@ -1,21 +1,51 @@
-import gi
+import threading
 
-gi.require_version("Gtk", "3.0")
+_Gtk = None
+_GLib = None
 
-from gi.repository import Gtk, GLib
+
+def _require_gtk():
+    global _Gtk, _GLib
+    if _Gtk is None:
+        import gi
+
+        gi.require_version("Gtk", "3.0")
+
+        from gi.repository import Gtk, GLib
+
+        _Gtk, _GLib = Gtk, GLib
+    return _Gtk, _GLib
+
+
+_pending_errors: set[tuple[str, str]] = set()
+_pending_errors_lock = threading.Lock()
+
+
+def _on_error_dialog_response(dialog, response, title: str, message: str) -> None:
+    dialog.destroy()
+    with _pending_errors_lock:
+        _pending_errors.discard((title, message))
+
+
+def _show_error_dialog(window, title: str, message: str) -> bool:
+    Gtk, _ = _require_gtk()
+    dialog = Gtk.MessageDialog(
+        window,
+        0,
+        Gtk.MessageType.ERROR,
+        Gtk.ButtonsType.CLOSE,
+        title,
+    )
+    dialog.format_secondary_text(message)
+    dialog.connect("response", _on_error_dialog_response, title, message)
+    dialog.show_all()
+    return False
 
 
 def show_error_dialog(window, title: str, message: str) -> None:
-    def inner() -> None:
-        dialog = Gtk.MessageDialog(
-            window,
-            0,
-            Gtk.MessageType.ERROR,
-            Gtk.ButtonsType.CLOSE,
-            title,
-        )
-        dialog.format_secondary_text(message)
-        dialog.run()
-        dialog.destroy()
-
-    GLib.idle_add(inner)
+    with _pending_errors_lock:
+        if (title, message) in _pending_errors:
+            return
+        _pending_errors.add((title, message))
+    _, GLib = _require_gtk()
+    GLib.idle_add(_show_error_dialog, window, title, message)
@@ -1,5 +1,8 @@
+import collections
+import json
 import os
 import re
+import shutil
 import signal
 import subprocess
 import sys
@@ -8,22 +11,29 @@ import threading
 import time
 import traceback
 import urllib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
-from .devices import get_device, Device
+from .devices import get_device, DEFAULT_DEVICE
 from .ffmpeg import (
     parse_ffmpeg_time,
     check_ffmpeg_installed,
     extract_thumbnail,
-    get_media_duration,
 )
 from .gui import show_error_dialog
 from .screensaver import ScreenSaverInhibitor
 from .utils import throttle, is_pid_running, start_thread, humanize_seconds
 from .cache import (
+    PROBE_CACHE_DIR,
     TRANSCODE_CACHE_MP4,
     check_transcode_cache,
     delete_transcode_cache,
+    probe_cache_key,
+    probe_thumbnail_path,
+    prune_probe_cache,
+    read_probe_cache,
+    write_probe_cache,
     write_transcode_cache,
 )
 from .version import __version__
@@ -33,6 +43,7 @@ from .subtitles import convert_subtitles_to_webvtt, extract_single_subtitle
 DEPS_MET = True
 try:
     import pychromecast
+    import zeroconf
 except Exception as e:
     traceback.print_exc()
     print(e)
@@ -62,6 +73,41 @@ Thanks! - Gnomecast
 
 AUDIO_EXTS = ("aac", "mp3", "wav")
 
+# Keys emitted by ffmpeg's machine-readable -progress output.
+_PROGRESS_KEYS = frozenset(
+    {
+        "frame",
+        "fps",
+        "bitrate",
+        "total_size",
+        "out_time_us",
+        "out_time_ms",
+        "out_time",
+        "dup_frames",
+        "drop_frames",
+        "speed",
+        "progress",
+    }
+)
+
+_VIDEO_CODECS_H264 = frozenset({"h264"})
+_VIDEO_CODECS_H265 = frozenset({"h264", "h265", "hevc"})
+_AUDIO_CODECS_AC3 = frozenset({"aac", "mp3", "ac3"})
+_AUDIO_CODECS_NO_AC3 = frozenset({"aac", "mp3"})
+
+_TMP_DIR = "/var/tmp" if os.path.isdir("/var/tmp") else None
+
+_ALNUM_RE = re.compile(r"[^0-9A-Za-z]")
+
+_LOGO_SVG = (Path(__file__) / ".." / "assets" / "gnomecast.svg").resolve().read_text()
+
+
+@lru_cache(maxsize=None)
+def _render_logo(width=200, color=None):
+    svg = _LOGO_SVG.replace("#aaaaaa", color) if color else _LOGO_SVG
+    stream = Gio.MemoryInputStream.new_from_bytes(GLib.Bytes.new(svg.encode()))
+    return GdkPixbuf.Pixbuf.new_from_stream(stream, None)
+
 
 class StreamMetadata:
     def __init__(self, index, codec, title):
@@ -98,80 +144,174 @@ class AudioMetadata(StreamMetadata):
 
 
 class FileMetadata:
-    def __init__(self, fn, callback):
+    # Cap concurrent parses so queueing a large folder doesn't spawn an
+    # ffmpeg/ffprobe pair per file all at once.
+    _gate = threading.Semaphore(max(2, os.cpu_count() or 4))
+
+    def __init__(self, fn, callback=None, _ffmpeg_output=None):
         self.fn = fn
         self.ready = False
-
-        def parse():
-            self.thumbnail_fn = str(extract_thumbnail(fn))
-            self._ffmpeg_output = subprocess.check_output(
-                ["ffmpeg", "-i", fn, "-f", "ffmetadata", "-"],
-                stderr=subprocess.STDOUT,
-            ).decode()
-            _important_ffmpeg = []
-            output = self._ffmpeg_output.split("\n")
-            self.container = fn.lower().split(".")[-1]
-            self.video_streams = []
-            self.audio_streams = []
-            self.subtitles = []
-            stream = None
-            for line in output:
-                line = line.strip()
-                if line.startswith("ffmpeg version"):
-                    _important_ffmpeg.append(line)
-                if line.startswith("Stream") and "Video" in line:
-                    _important_ffmpeg.append(line)
-                    id = line.split()[1].strip("#").strip(":")
-                    title = "Video #%i" % (len(self.video_streams) + 1)
-                    if "(" in id:
-                        title = id[id.index("(") + 1 : id.index(")")]
-                        id = id[: id.index("(")]
-                    video_codec = line.split()[3]
-                    stream = StreamMetadata(id, video_codec, title)
-                    self.video_streams.append(stream)
-                elif line.startswith("Stream") and "Audio" in line:
-                    _important_ffmpeg.append(line)
-                    title = "Audio #%i" % (len(self.audio_streams) + 1)
-                    id = line.split()[1].strip("#").strip(":")
-                    if "(" in id:
-                        title = id[id.index("(") + 1 : id.index(")")]
-                        id = id[: id.index("(")]
-                    audio_codec = line.split()[3].strip(",")
-                    stream = AudioMetadata(id, audio_codec, title=title)
-                    if ", stereo, " in line:
-                        stream.channels = 1
-                    if ", stereo, " in line:
-                        stream.channels = 2
-                    if ", 5.1" in line:
-                        stream.channels = 6
-                    if ", 7.1" in line:
-                        stream.channels = 8
-                    self.audio_streams.append(stream)
-                elif line.startswith("Stream") and "Subtitle" in line:
-                    _important_ffmpeg.append(line)
-                    id = line.split()[1].strip("#").strip(":")
-                    print(line, id)
-                    if "(" in id:
-                        title = id[id.index("(") + 1 : id.index(")")]
-                        id = id[: id.index("(")]
-                    stream = StreamMetadata(id, None, title)
-                    self.subtitles.append(stream)
-                elif stream and line.startswith("title"):
-                    _important_ffmpeg.append(line)
-                    stream.title = line.split(":", 1)[1].strip()
-                elif line.startswith("Output"):
-                    break
-            self._important_ffmpeg = "\n".join(_important_ffmpeg)
+        self._ready_event = threading.Event()
+
+        if _ffmpeg_output is not None:
+            # Test seam: parse a canned ffprobe JSON document synchronously,
+            # without spawning ffmpeg/ffprobe.
+            self._ffmpeg_output = _ffmpeg_output
+            self.thumbnail_fn = None
+            self._parse_probe_json(json.loads(_ffmpeg_output))
             self.load_subtitles()
             self.ready = True
+            self._ready_event.set()
             if callback:
                 callback(self)
+            return
+
+        def parse():
+            with self._gate:
+                self._parse(callback)
 
         start_thread(parse)
 
+    def _parse(self, callback):
+        fn = self.fn
+        key = probe_cache_key(fn)
+        if key:
+            cached = read_probe_cache(key)
+            if cached and self._load_probe_cache(key, cached):
+                self.ready = True
+                self._ready_event.set()
+                if callback:
+                    callback(self)
+                return
+        # Thumbnail extraction and the probe are independent ffmpeg
+        # invocations; run them concurrently.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            thumbnail_future = executor.submit(extract_thumbnail, fn)
+            probe_future = executor.submit(
+                subprocess.run,
+                [
+                    "ffprobe",
+                    *("-v", "error"),
+                    *("-print_format", "json"),
+                    "-show_streams",
+                    "-show_format",
+                    fn,
+                ],
+                check=True,
+                capture_output=True,
+                timeout=30,
+            )
+            self.thumbnail_fn = str(thumbnail_future.result())
+            result = probe_future.result()
+        self._ffmpeg_output = result.stdout.decode()
+        self._parse_probe_json(json.loads(self._ffmpeg_output))
+        if key:
+            self._write_probe_cache(key)
+        self.load_subtitles()
+        self.ready = True
+        self._ready_event.set()
+        if callback:
+            callback(self)
+
+    def _parse_probe_json(self, data):
+        _important_ffmpeg = []
+        self.container = os.path.splitext(self.fn)[1].lstrip(".").lower()
+        self.video_streams = []
+        self.audio_streams = []
+        self.subtitles = []
+        for s in data.get("streams", []):
+            index = "0:%s" % s["index"]
+            codec = s.get("codec_name")
+            tags = s.get("tags") or {}
+            title = tags.get("title") or tags.get("language")
+            if s.get("codec_type") == "video":
+                title = title or "Video #%i" % (len(self.video_streams) + 1)
+                stream = StreamMetadata(index, codec, title)
+                self.video_streams.append(stream)
+            elif s.get("codec_type") == "audio":
+                title = title or "Audio #%i" % (len(self.audio_streams) + 1)
+                stream = AudioMetadata(index, codec, title=title)
+                stream.channels = s.get("channels", 2)
+                self.audio_streams.append(stream)
+            elif s.get("codec_type") == "subtitle":
+                title = title or "Subtitle #%i" % (len(self.subtitles) + 1)
+                stream = StreamMetadata(index, codec, title)
+                self.subtitles.append(stream)
+            else:
+                continue
+            _important_ffmpeg.append(
+                "Stream #%s: %s %s (%s)"
+                % (index, s.get("codec_type"), codec, title)
+            )
+        self._important_ffmpeg = "\n".join(_important_ffmpeg)
+
+    def _load_probe_cache(self, key, cached):
+        thumbnail_fn = probe_thumbnail_path(key)
+        if not os.path.isfile(thumbnail_fn):
+            return False
+        try:
+            video_streams = [
+                StreamMetadata(s["index"], s["codec"], s["title"])
+                for s in cached["video_streams"]
+            ]
+            audio_streams = []
+            for s in cached["audio_streams"]:
+                stream = AudioMetadata(s["index"], s["codec"], s["title"])
+                stream.channels = s["channels"]
+                audio_streams.append(stream)
+            subtitles = [
+                StreamMetadata(s["index"], s["codec"], s["title"])
+                for s in cached["subtitles"]
+            ]
+            self.container = cached["container"]
+            self._ffmpeg_output = cached["ffmpeg_output"]
+            self._important_ffmpeg = cached["important_ffmpeg"]
+        except (KeyError, TypeError):
+            return False
+        self.thumbnail_fn = thumbnail_fn
+        self.video_streams = video_streams
+        self.audio_streams = audio_streams
+        self.subtitles = subtitles
+        self.load_subtitles()
+        return True
+
+    def _write_probe_cache(self, key):
+        thumbnail_fn = probe_thumbnail_path(key)
+        try:
+            os.makedirs(os.path.dirname(thumbnail_fn), exist_ok=True)
+            shutil.move(self.thumbnail_fn, thumbnail_fn)
+        except OSError:
+            return
+        self.thumbnail_fn = thumbnail_fn
+        write_probe_cache(
+            key,
+            {
+                "source_path": os.path.abspath(self.fn),
+                "container": self.container,
+                "ffmpeg_output": self._ffmpeg_output,
+                "important_ffmpeg": self._important_ffmpeg,
+                "video_streams": [
+                    {"index": s.index, "codec": s.codec, "title": s.title}
+                    for s in self.video_streams
+                ],
+                "audio_streams": [
+                    {
+                        "index": s.index,
+                        "codec": s.codec,
+                        "title": s.title,
+                        "channels": s.channels,
+                    }
+                    for s in self.audio_streams
+                ],
+                "subtitles": [
+                    {"index": s.index, "codec": s.codec, "title": s.title}
+                    for s in self.subtitles
+                ],
+            },
+        )
+
     def wait(self):
-        while not self.ready:
-            time.sleep(1)
+        self._ready_event.wait()
 
     def load_subtitles(self):
         for stream in self.subtitles:
@@ -202,17 +342,31 @@ class Transcoder:
         video_stream,
         audio_stream,
         done_callback,
-        error_callback,
+        error_callback=None,
         prev_transcoder=None,
+        fake=False,
     ):
         self.fmd = fmd
         self.video_stream = video_stream
         self.audio_stream = audio_stream
         fn = fmd.fn
         self.cast = cast
+        self.device = get_device(
+            cast.cast_info.manufacturer, cast.cast_info.model_name
+        )
+        if self.device is None:
+            self.device = DEFAULT_DEVICE
+        h265 = self.device.h265 and cast.cast_info.cast_type != "audio"
+        self._playable_video_codecs = (
+            _VIDEO_CODECS_H265 if h265 else _VIDEO_CODECS_H264
+        )
+        self._playable_audio_codecs = (
+            _AUDIO_CODECS_AC3 if self.device.ac3 else _AUDIO_CODECS_NO_AC3
+        )
         self.source_fn = fn
         self.p = None
         self.using_cache = False
+        self._progress_cond = threading.Condition()
 
         if prev_transcoder:
             prev_transcoder.destroy()
@@ -266,24 +420,43 @@ class Transcoder:
             self.transcode_cmd += [
                 "-c:v",
                 "h264" if self.transcode_video else "copy",
-            ]  # '-movflags', 'faststart'
+            ]
+            if fmd.container != "mp4":
+                # Non-mp4 sources are fully written before wait_for_byte
+                # serves them, so ffmpeg can safely relocate the moov atom
+                # to the front and the Chromecast starts without seeking.
+                self.transcode_cmd += ["-movflags", "+faststart"]
+            # Machine-readable progress on stdout; only errors on stderr.
+            self.transcode_cmd += [
+                "-nostats",
+                "-loglevel",
+                "error",
+                "-progress",
+                "pipe:1",
+            ]
+
+            if fake:
+                # Test seam: stop once the command is decided; don't touch
+                # the cache or start ffmpeg.
+                return
 
             # Check transcode cache before starting ffmpeg
             if check_transcode_cache(self.source_fn, self.transcode_cmd):
                 print("Using cached transcode:", TRANSCODE_CACHE_MP4)
                 self.trans_fn = TRANSCODE_CACHE_MP4
+                self.fn = self.trans_fn
                 self.using_cache = True
                 self.done = True
                 self.done_callback()
                 return
 
-            dir = "/var/tmp" if os.path.isdir("/var/tmp") else None
             self.trans_fn = tempfile.mkstemp(
                 suffix=".mp4",
                 prefix="gnomecast_pid%i_transcode_" % os.getpid(),
-                dir=dir,
+                dir=_TMP_DIR,
             )[1]
             os.remove(self.trans_fn)
+            self.fn = self.trans_fn
 
             self.transcode_cmd += [self.trans_fn]
             print(" ".join(["'%s'" % s if " " in s else s for s in self.transcode_cmd]))
@@ -291,90 +464,83 @@ class Transcoder:
             print(" starting ffmpeg at:")
             print("---------------------")
             self.p = subprocess.Popen(
-                self.transcode_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+                self.transcode_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=1024 * 1024,
             )
             start_thread(self.monitor, daemon=True)
         else:
+            self.fn = self.source_fn
             self.done = True
-            self.done_callback()
-
-    @property
-    def device(self) -> Device:
-        return get_device(
-            self.cast.cast_info.manufacturer, self.cast.cast_info.model_name
-        )
-
-    @property
-    def fn(self):
-        return self.trans_fn if self.transcode else self.source_fn
+            if not fake:
+                self.done_callback()
 
     def can_play_video_codec(self, video_codec):
-        h265 = False if self.cast.cast_info.cast_type == "audio" else self.device.h265
-        if h265:
-            return video_codec in ("h264", "h265", "hevc")
-        else:
-            return video_codec in ("h264",)
+        return video_codec in self._playable_video_codecs
 
     def can_play_audio_stream(self, stream):
         if not stream:
             return True
-        if self.device.ac3:
-            return stream.codec in ("aac", "mp3", "ac3")
-        else:
-            return stream.codec in ("aac", "mp3")
+        return stream.codec in self._playable_audio_codecs
 
     def wait_for_byte(self, offset, buffer=128 * 1024 * 1024):
         if self.done:
             return
-        if self.source_fn.lower().split(".")[-1] == "mp4":
-            while offset > self.progress_bytes + buffer:
-                print("waiting for", offset, "at", self.progress_bytes + buffer)
-                time.sleep(2)
+        if os.path.splitext(self.source_fn)[1].lower() == ".mp4":
+            with self._progress_cond:
+                self._progress_cond.wait_for(
+                    lambda: self.done or offset <= self.progress_bytes + buffer
+                )
         else:
-            while not self.done:
-                print("waiting for transcode to finish")
-                time.sleep(2)
-        print("done waiting")
+            with self._progress_cond:
+                self._progress_cond.wait_for(lambda: self.done)
 
     def monitor(self):
-        line = b""
-        r = re.compile(r"=\s+")
-        total_output = b""
-        while self.p:
-            byte = self.p.stdout.read(1)
-            total_output += byte
-            if byte == b"" and self.p.poll() is not None:
-                break
-            if byte != b"":
-                line += byte
-                if byte == b"\r":
-                    # frame=92578 fps=3937 q=-1.0 size= 1142542kB time=01:04:21.14 bitrate=2424.1kbits/s speed= 164x
-                    line = line.decode()
-                    line = r.sub("=", line)
-                    items = [s.split("=") for s in line.split()]
-                    d = dict([x for x in items if len(x) == 2])
-                    print(d)
-                    self.progress_bytes = (
-                        int(d.get("size", "0kb").lower().rstrip("kib")) * 1024
-                    )
-                    progress = parse_ffmpeg_time(d.get("time", "00:00:00"))
-                    if progress is not None:
-                        self.progress_seconds = progress
-                    line = b""
+        # -progress writes newline-delimited key=value pairs, one block per
+        # update, each terminated by a progress= line. Anything else on the
+        # pipe is error output; keep only a bounded tail of it, since
+        # ffmpeg's fatal errors are always near the end.
+        tail = collections.deque(maxlen=256)
+        for raw_line in self.p.stdout:
+            line = raw_line.decode(errors="replace").strip()
+            if not line:
+                continue
+            key, sep, value = line.partition("=")
+            if not sep or (key not in _PROGRESS_KEYS and not key.startswith("stream_")):
+                tail.append(line)
+                continue
+            if key == "total_size":
+                if value.isdigit():
+                    self.progress_bytes = int(value)
+            elif key == "out_time":
+                progress = parse_ffmpeg_time(value)
+                if progress is not None:
+                    self.progress_seconds = progress
+            elif key == "progress":
+                with self._progress_cond:
+                    self._progress_cond.notify_all()
         if self.p:
             self.p.stdout.close()
-            if self.p.returncode:
+            if self.p.wait():
+                output_tail = "\n".join(tail)
                 print("--== transcode error ==--")
-                print(total_output)
-                self.error_callback(total_output.decode())
+                print(output_tail)
+                with self._progress_cond:
+                    self.done = True
+                    self._progress_cond.notify_all()
+                self.error_callback(output_tail)
                 return
-        self.done = True
+        with self._progress_cond:
+            self.done = True
+            self._progress_cond.notify_all()
         # Save to transcode cache
         if self.trans_fn and os.path.isfile(self.trans_fn):
             delete_transcode_cache()
             try:
                 os.rename(self.trans_fn, TRANSCODE_CACHE_MP4)
                 self.trans_fn = TRANSCODE_CACHE_MP4
+                self.fn = self.trans_fn
                 self.using_cache = True
                 # Save cache metadata (command without output path)
                 cache_cmd = self.transcode_cmd[:-1]
@@ -388,11 +554,28 @@ class Transcoder:
         if self.done_callback:
             self.done_callback(did_transcode=True)
 
-    def destroy(self):
+    def terminate_nowait(self):
         if self.p and self.p.poll() is None:
             self.p.terminate()
-        if self.trans_fn and os.path.isfile(self.trans_fn) and not self.using_cache:
-            os.remove(self.trans_fn)
+
+    def wait_or_kill(self, timeout=0.5):
+        if self.p and self.p.poll() is None:
+            try:
+                self.p.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.p.kill()
+        self._remove_trans_fn()
+
+    def _remove_trans_fn(self):
+        if self.trans_fn and not self.using_cache:
+            try:
+                os.unlink(self.trans_fn)
+            except FileNotFoundError:
+                pass
+
+    def destroy(self):
+        self.terminate_nowait()
+        self._remove_trans_fn()
 
     def __del__(self):
         self.destroy()
@@ -406,11 +589,24 @@ class Gnomecast:
         self.last_known_current_time = None
         self.last_time_current_time = None
         self.fn = None
+        self._fn_hash = None
+        self._media_url_base = None
         self.video_stream = None
         self.audio_stream = None
         self.last_fn_played = None
         self.transcoder = None
         self.duration = None
+        # Side table of queue rows keyed by filename, so progress updates
+        # don't have to walk files_store.
+        self._queue_rows = {}
+        self._cast_browser = None
+        self._zconf = None
+        self._wanted_device = None
+        self._pending_fmd_updates = []
+        self._pending_fmd_lock = threading.Lock()
+        self._icon_fn = None
+        self._file_dialog = None
+        self._subtitle_dialog = None
         self.subtitles = None
         self.seeking = False
         self.last_known_volume_level = None
@@ -422,7 +618,7 @@ class Gnomecast:
         self.init_casts(device=device)
         start_thread(self.check_ffmpeg)
         start_thread(self.start_server, daemon=True)
-        start_thread(self.monitor_cast, daemon=True)
+        GLib.timeout_add_seconds(1, self.monitor_cast_tick)
         if fn:
             self.queue_files([fn])
         if subtitles:
@@ -457,67 +653,63 @@ class Gnomecast:
 
         #    if self.last_known_player_state and self.last_known_player_state!='UNKNOWN':
         #      notes.append('Cast: %s' % self.last_known_player_state)
+        self.refresh_queue_progress()
+
+    @throttle(seconds=0.25)
+    def refresh_queue_progress(self):
         def f():
-            for row in self.files_store:
-                duration = row[2]
-                transcoder = row[7]
-                if transcoder:
-                    if duration:
-                        if transcoder.done:
-                            row[5] = 100
-                        else:
-                            row[5] = transcoder.progress_seconds * 100 // duration
+            for entry in self._queue_rows.values():
+                duration = entry["duration"]
+                transcoder = entry["transcoder"]
+                if transcoder and duration:
+                    if transcoder.done:
+                        progress = 100
+                    else:
+                        progress = transcoder.progress_seconds * 100 // duration
+                    if entry["last_percent"] != progress:
+                        entry["last_percent"] = progress
+                        path = entry["ref"].get_path()
+                        if path is not None:
+                            self.files_store[path][5] = progress
 
         GLib.idle_add(f)
 
-    def monitor_cast(self):
-        while True:
-            time.sleep(1)
-            if not self.cast:
-                continue
-            seeking = self.seeking
-            cast = self.cast
-            mc = cast.media_controller
-            if mc.status.player_state != self.last_known_player_state:
-                if (
-                    mc.status.player_state == "PLAYING"
-                    and self.last_known_player_state == "BUFFERING"
-                    and seeking
-                ):
-                    self.seeking = False
-                if (
-                    mc.status.player_state == "IDLE"
-                    and self.last_known_player_state == "PLAYING"
-                ):
-                    self.check_for_next_in_queue()
-                if mc.status.player_state == "PLAYING":
-                    self.screen_saver_inhibitor.start()
-                else:
-                    self.screen_saver_inhibitor.stop()
-                self.last_known_player_state = mc.status.player_state
-
-                def f():
-                    self.update_media_button_states()
-                    self.update_status()
-
-                GLib.idle_add(f)
-            elif self.transcoder and not self.transcoder.done:
-
-                def f():
-                    self.update_status()
-
-                GLib.idle_add(f)
-            if self.last_known_current_time != mc.status.current_time:
-                self.last_known_current_time = mc.status.current_time
-                self.last_time_current_time = time.time()
-            if not seeking and mc.status.player_state == "PLAYING":
-                GLib.idle_add(
-                    lambda: self.scrubber_adj.set_value(
-                        mc.status.current_time
-                        + time.time()
-                        - self.last_time_current_time
-                    )
-                )
+    def monitor_cast_tick(self):
+        # Runs on the GTK main loop, so widgets can be updated directly.
+        if not self.cast:
+            return True
+        seeking = self.seeking
+        cast = self.cast
+        mc = cast.media_controller
+        if mc.status.player_state != self.last_known_player_state:
+            if (
+                mc.status.player_state == "PLAYING"
+                and self.last_known_player_state == "BUFFERING"
+                and seeking
+            ):
+                self.seeking = False
+            if (
+                mc.status.player_state == "IDLE"
+                and self.last_known_player_state == "PLAYING"
+            ):
+                self.check_for_next_in_queue()
+            if mc.status.player_state == "PLAYING":
+                self.screen_saver_inhibitor.start()
+            else:
+                self.screen_saver_inhibitor.stop()
+            self.last_known_player_state = mc.status.player_state
+            self.update_media_button_states()
+            self.update_status()
+        elif self.transcoder and not self.transcoder.done:
+            self.update_status()
+        if self.last_known_current_time != mc.status.current_time:
+            self.last_known_current_time = mc.status.current_time
+            self.last_time_current_time = time.monotonic()
+        if not seeking and mc.status.player_state == "PLAYING":
+            self.scrubber_adj.set_value(
+                mc.status.current_time + time.monotonic() - self.last_time_current_time
+            )
+        return True
 
     def init_casts(self, widget=None, device=None):
         self.cast_store.clear()
@@ -526,34 +718,96 @@ class Gnomecast:
         start_thread(self.load_casts, kwargs={"device": device})
 
     def load_casts(self, device=None):
-        chromecasts, _ = pychromecast.get_chromecasts()
+        self._wanted_device = device
+        if self._cast_browser:
+            self._cast_browser.stop_discovery()
+            self._cast_browser = None
+            self._zconf = None
 
         def update_ui():
             self.cast_store.clear()
             self.cast_store.append([None, "Select a cast device..."])
             self.cast_store.append([-1, "Add a non-local Chromecast..."])
-            for cc in chromecasts:
-                friendly_name = cc.cast_info.friendly_name
-                if cc.cast_type != "cast":
-                    friendly_name = "%s (%s)" % (friendly_name, cc.cast_type)
-                self.cast_store.append([cc, friendly_name])
-            if device:
-                found = False
-                for i, cc in enumerate(chromecasts):
-                    if device == cc.cast_info.friendly_name:
-                        self.cast_combo.set_active(i + 1)
-                        found = True
-                if not found:
-                    self.cast_combo.set_active(0)
-                    show_error_dialog(
-                        self.win,
-                        "Chromecast not found",
-                        f"The Chromecast {device} wasn't found.",
-                    )
-            else:
-                self.cast_combo.set_active(2 if len(chromecasts) == 1 else 0)
+            self.cast_combo.set_active(0)
 
         GLib.idle_add(update_ui)
+        self._zconf = zeroconf.Zeroconf()
+        self._cast_browser = pychromecast.discovery.CastBrowser(
+            pychromecast.discovery.SimpleCastListener(
+                add_callback=self.on_cast_discovered,
+                remove_callback=self.on_cast_removed,
+            ),
+            self._zconf,
+        )
+        self._cast_browser.start_discovery()
+        if device:
+            GLib.timeout_add_seconds(10, self.wanted_device_timed_out, device)
+
+    def on_cast_discovered(self, uuid, _service):
+        # Called from the zeroconf thread; marshal to the Gtk loop. The
+        # browser can be swapped out by a refresh while this runs.
+        browser = self._cast_browser
+        cast_info = browser.devices.get(uuid) if browser else None
+        if cast_info:
+            GLib.idle_add(self.add_cast_to_store, cast_info)
+
+    def on_cast_removed(self, uuid, _service, _cast_info):
+        GLib.idle_add(self.remove_cast_from_store, uuid)
+
+    def add_cast_to_store(self, cast_info):
+        for row in self.cast_store:
+            existing = row[0]
+            if getattr(existing, "uuid", None) == cast_info.uuid:
+                return False
+        friendly_name = cast_info.friendly_name
+        if cast_info.cast_type != "cast":
+            friendly_name = "%s (%s)" % (friendly_name, cast_info.cast_type)
+        self.cast_store.append([cast_info, friendly_name])
+        if self._wanted_device is not None:
+            if cast_info.friendly_name == self._wanted_device:
+                self._wanted_device = None
+                self.cast_combo.set_active(len(self.cast_store) - 1)
+        elif len(self.cast_store) == 3:
+            # Mirror the old "exactly one device found" auto-select without
+            # waiting out the full discovery timeout.
+            GLib.timeout_add_seconds(3, self.maybe_select_only_cast)
+        return False
+
+    def maybe_select_only_cast(self):
+        if (
+            len(self.cast_store) == 3
+            and not self.cast
+            and self.cast_combo.get_active() == 0
+        ):
+            self.cast_combo.set_active(2)
+        return False
+
+    def remove_cast_from_store(self, uuid):
+        for row in self.cast_store:
+            if getattr(row[0], "uuid", None) == uuid:
+                self.cast_store.remove(row.iter)
+                break
+        return False
+
+    def wanted_device_timed_out(self, device):
+        if self._wanted_device == device:
+            self._wanted_device = None
+            self.cast_combo.set_active(0)
+            show_error_dialog(
+                self.win,
+                "Chromecast not found",
+                f"The Chromecast {device} wasn't found.",
+            )
+        return False
+
+    def connect_to_cast(self, cast_info):
+        # The browser and its Zeroconf instance stay alive for the whole
+        # session: resolving a CastInfo needs the live Zeroconf, and the
+        # add/remove callbacks keep the combo current as devices come and
+        # go. Both are torn down in quit().
+        cast = pychromecast.get_chromecast_from_cast_info(cast_info, self._zconf)
+        cast.wait()
+        GLib.idle_add(self.select_cast, cast)
 
     def update_media_button_states(self):
         mc = self.cast.media_controller if self.cast else None
@@ -601,38 +855,24 @@ class Gnomecast:
         self.update_button_visible()
 
     def build_gui(self):
-        self.win = win = Gtk.ApplicationWindow(title="Gnomecast v%s" % __version__)
-        win.set_border_width(0)
+        # The static widget tree lives in ui/main.ui; GtkBuilder constructs it
+        # in one pass.  Only the dynamically-populated models are built here.
+        builder = Gtk.Builder.new_from_file(
+            str((Path(__file__) / ".." / "ui" / "main.ui").resolve())
+        )
+        self.win = win = builder.get_object("win")
+        win.set_title("Gnomecast v%s" % __version__)
         win.set_icon(self.get_logo_pixbuf(color="#000000"))
         enforce_target = Gtk.TargetEntry.new("text/plain", Gtk.TargetFlags(4), 129)
         win.drag_dest_set(Gtk.DestDefaults.ALL, [enforce_target], Gdk.DragAction.COPY)
-        win.connect("drag-data-received", self.on_drag_data_received)
-        self.cast_store = cast_store = Gtk.ListStore(object, str)
-
-        vbox_outer = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=16)
 
-        self.thumbnail_image = Gtk.Image()
+        self.thumbnail_image = builder.get_object("thumbnail_image")
         self.thumbnail_image.set_from_pixbuf(self.get_logo_pixbuf())
-        vbox_outer.pack_start(self.thumbnail_image, True, False, 0)
-        alignment = Gtk.Alignment(xscale=1, yscale=1)
-        alignment.add(vbox)
-        alignment.set_padding(16, 20, 16, 16)
-        vbox_outer.pack_start(alignment, False, False, 0)
-
-        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
-        vbox.pack_start(hbox, False, False, 0)
-        self.cast_combo = cast_combo = Gtk.ComboBox.new_with_model(cast_store)
-        cast_combo.set_entry_text_column(1)
-        renderer_text = Gtk.CellRendererText()
-        cast_combo.pack_start(renderer_text, True)
-        cast_combo.add_attribute(renderer_text, "text", 1)
-        hbox.pack_start(cast_combo, True, True, 0)
-        refresh_button = Gtk.Button(None, image=Gtk.Image(stock=Gtk.STOCK_REFRESH))
-        refresh_button.connect("clicked", self.init_casts)
-        hbox.pack_start(refresh_button, False, False, 0)
-
-        win.add(vbox_outer)
+
+        self.cast_store = Gtk.ListStore(object, str)
+        self.cast_combo = builder.get_object("cast_combo")
+        self.cast_combo.set_model(self.cast_store)
+        self.cast_combo.set_entry_text_column(1)
 
         # list of queued files
         self.files_store = Gtk.ListStore(
@@ -640,142 +880,46 @@ class Gnomecast:
         )  # name, path, duration, duration_str, thumbnail_fn, transcode_progress, status_icon, transcoder, file_metadata
         self.files_store.connect("row-inserted", self.update_button_visible)
         self.files_store.connect("row-deleted", self.update_button_visible)
-        self.files_view = Gtk.TreeView(self.files_store)
-        self.files_view.get_selection().set_mode(Gtk.SelectionMode.MULTIPLE)
-        self.files_view.set_headers_visible(False)
-        self.files_view.set_rules_hint(True)
-        column = Gtk.TreeViewColumn("Name", Gtk.CellRendererText(), text=0)
-        column.set_expand(True)
-        self.files_view.append_column(column)
-        self.file_view_column_renderer = r = Gtk.CellRendererText()
-        r.props.xalign = 1.0
-        self.files_view.append_column(Gtk.TreeViewColumn("Duration", r, text=3))
-        self.files_view_progress_column = column_progress = Gtk.TreeViewColumn(
-            "Progress", Gtk.CellRendererProgress(), value=5
-        )
-        self.files_view.append_column(column_progress)
-
-        column_pixbuf = Gtk.TreeViewColumn(
-            "Playing", Gtk.CellRendererPixbuf(), icon_name=6
+        self.files_view = builder.get_object("files_view")
+        self.files_view.set_model(self.files_store)
+        self.file_view_column_renderer = builder.get_object("duration_renderer")
+        self.files_view_progress_column = builder.get_object(
+            "files_view_progress_column"
         )
-        self.files_view.append_column(column_pixbuf)
-
-        select = self.files_view.get_selection()
-        select.connect("changed", self.on_files_view_selection_changed)
-        self.files_view.connect("row-activated", self.on_files_view_row_activated)
 
         # contains the files list and the buttons to add/del
-        self.hbox = hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
-        vbox.pack_start(hbox, False, False, 0)
-
-        self.scrolled_window = Gtk.ScrolledWindow()
-        self.scrolled_window.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-        self.scrolled_window.add(self.files_view)
-        hbox.pack_start(self.scrolled_window, True, True, 0)
-
-        self.btn_vbox = btn_vbox = Gtk.Box(
-            orientation=Gtk.Orientation.VERTICAL, spacing=8
-        )
-        hbox.pack_start(btn_vbox, True, True, 0)
-        self.file_button = Gtk.Button(None, image=Gtk.Image(stock=Gtk.STOCK_ADD))
-        self.file_button.set_tooltip_text("Add one or more audio or video files...")
-        self.file_button.set_always_show_image(True)
-        self.file_button.connect("clicked", self.on_file_clicked)
-        btn_vbox.pack_start(self.file_button, True, True, 0)
-        self.remove_button = Gtk.Button(None, image=Gtk.Image(stock=Gtk.STOCK_REMOVE))
-        self.remove_button.set_tooltip_text(
-            "Overwrite original file with transcoded version."
-        )
-        self.remove_button.connect("clicked", self.remove_files)
-        self.remove_button.set_sensitive(False)
-        btn_vbox.pack_start(self.remove_button, False, False, 0)
-
-        self.file_detail_row = hbox = Gtk.Box(
-            orientation=Gtk.Orientation.HORIZONTAL, spacing=8
-        )
-        vbox.pack_start(self.file_detail_row, False, False, 0)
+        self.hbox = builder.get_object("files_row")
+        self.scrolled_window = builder.get_object("scrolled_window")
+        self.btn_vbox = builder.get_object("btn_vbox")
+        self.file_button = builder.get_object("file_button")
+        self.remove_button = builder.get_object("remove_button")
+        self.file_detail_row = builder.get_object("file_detail_row")
 
         # audio/video track selection
         self.stream_store = Gtk.ListStore(str, object, object)
-        self.audio_combo = Gtk.ComboBox.new_with_model(self.stream_store)
-        self.audio_combo.connect("changed", self.on_audio_combo_changed)
+        self.audio_combo = builder.get_object("audio_combo")
+        self.audio_combo.set_model(self.stream_store)
         self.audio_combo.set_entry_text_column(0)
-        renderer_text = Gtk.CellRendererText()
-        self.audio_combo.pack_start(renderer_text, True)
-        self.audio_combo.add_attribute(renderer_text, "text", 0)
-        self.file_detail_row.pack_start(self.audio_combo, True, True, 0)
 
         # subtitle selection
         self.subtitle_store = Gtk.ListStore(
             str, object, object
         )  # title, stream, callback
-        self.subtitle_combo = Gtk.ComboBox.new_with_model(self.subtitle_store)
-        self.subtitle_combo.connect("changed", self.on_subtitle_combo_changed)
+        self.subtitle_combo = builder.get_object("subtitle_combo")
+        self.subtitle_combo.set_model(self.subtitle_store)
         self.subtitle_combo.set_entry_text_column(0)
-        renderer_text = Gtk.CellRendererText()
-        self.subtitle_combo.pack_start(renderer_text, True)
-        self.subtitle_combo.add_attribute(renderer_text, "text", 0)
         self.subtitle_combo.set_active(0)
-        self.file_detail_row.pack_start(self.subtitle_combo, True, True, 0)
-
-        file_info_button = Gtk.Button(
-            None, image=Gtk.Image(stock=Gtk.STOCK_DIALOG_INFO)
-        )
-        file_info_button.connect("clicked", self.show_file_info)
-        self.file_detail_row.pack_start(file_info_button, False, False, 0)
 
-        self.scrubber_adj = Gtk.Adjustment(0, 0, 100, 15, 60, 0)
-        self.scrubber = Gtk.Scale(
-            orientation=Gtk.Orientation.HORIZONTAL, adjustment=self.scrubber_adj
-        )
-        self.scrubber.set_digits(0)
-
-        def f(scale, s):
-            notes = [humanize_seconds(s)]
-            return "".join(notes)
+        self.scrubber_adj = builder.get_object("scrubber_adj")
+        self.scrubber = builder.get_object("scrubber")
 
-        self.scrubber.connect("format-value", f)
-        self.scrubber.connect("change-value", self.scrubber_move_started)
-        self.scrubber.connect("change-value", self.scrubber_moved)
-        self.scrubber.set_sensitive(False)
-        vbox.pack_start(self.scrubber, False, False, 0)
+        self.rewind_button = builder.get_object("rewind_button")
+        self.play_button = builder.get_object("play_button")
+        self.forward_button = builder.get_object("forward_button")
+        self.stop_button = builder.get_object("stop_button")
+        self.volume_button = builder.get_object("volume_button")
 
-        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=16)
-        self.rewind_button = Gtk.Button(
-            None, image=Gtk.Image(stock=Gtk.STOCK_MEDIA_REWIND)
-        )
-        self.rewind_button.connect("clicked", self.rewind_clicked)
-        self.rewind_button.set_sensitive(False)
-        self.rewind_button.set_relief(Gtk.ReliefStyle.NONE)
-        hbox.pack_start(self.rewind_button, True, False, 0)
-        self.play_button = Gtk.Button(None, image=Gtk.Image(stock=Gtk.STOCK_MEDIA_PLAY))
-        self.play_button.connect("clicked", self.play_clicked)
-        self.play_button.set_sensitive(False)
-        self.play_button.set_relief(Gtk.ReliefStyle.NONE)
-        hbox.pack_start(self.play_button, True, False, 0)
-        self.forward_button = Gtk.Button(
-            None, image=Gtk.Image(stock=Gtk.STOCK_MEDIA_FORWARD)
-        )
-        self.forward_button.connect("clicked", self.forward_clicked)
-        self.forward_button.set_sensitive(False)
-        self.forward_button.set_relief(Gtk.ReliefStyle.NONE)
-        hbox.pack_start(self.forward_button, True, False, 0)
-        self.stop_button = Gtk.Button(None, image=Gtk.Image(stock=Gtk.STOCK_MEDIA_STOP))
-        self.stop_button.connect("clicked", self.stop_clicked)
-        self.stop_button.set_sensitive(False)
-        self.stop_button.set_relief(Gtk.ReliefStyle.NONE)
-        hbox.pack_start(self.stop_button, True, False, 0)
-        self.volume_button = Gtk.VolumeButton()
-        self.volume_button.set_value(1)
-        self.volume_button.connect("value-changed", self.volume_moved)
-        self.volume_button.set_sensitive(False)
-        hbox.pack_start(self.volume_button, True, False, 0)
-        vbox.pack_start(hbox, False, False, 0)
-
-        cast_combo.connect("changed", self.on_cast_combo_changed)
-
-        win.connect("delete-event", self.quit)
-        win.connect("key_press_event", self.on_key_press)
+        builder.connect_signals(self)
         win.show_all()
 
         self.update_button_visible()
@@ -813,6 +957,9 @@ class Gnomecast:
         )
         self.file_detail_row.set_visible(bool(self.fn))
 
+    def scrubber_format_value(self, scale, seconds):
+        return humanize_seconds(seconds)
+
     def scrubber_move_started(self, scale, scroll_type, seconds):
         print("scrubber_move_started", seconds)
         self.seeking = True
@@ -831,6 +978,7 @@ class Gnomecast:
                 transcoder.destroy()
             fn = store.get_value(iterx, 1)
             store.remove(iterx)
+            self._queue_rows.pop(fn, None)
             if self.fn == fn:
                 self.unselect_file()
 
@@ -838,8 +986,13 @@ class Gnomecast:
         model = widget.get_model()
         print("double-clicked", model[row][:])
         fn = model[row][1]
+        if fn == self.fn:
+            # Activating the current row again would tear the selection down
+            # just to rebuild it; leave playback alone.
+            return True
         self.unselect_file()
         self.fn = fn
+        self._fn_hash = hash(fn)
         self.transcoder = model[row][7]
         self.duration = model[row][2]
         thumbnail_fn = model[row][4]
@@ -851,11 +1004,7 @@ class Gnomecast:
         def f():
             self.win.resize(1, 1)
             self.scrubber_adj.set_value(0)
-            for row in self.files_store:
-                if self.fn == row[1]:
-                    row[6] = "video-x-generic"
-                else:
-                    row[6] = None
+            self.set_playing_icon(self.fn)
             self.update_button_visible()
             self.update_media_button_states()
 
@@ -863,35 +1012,77 @@ class Gnomecast:
 
         return True
 
+    def on_fmd_ready(self, fmd):
+        # Called from parse threads; queueing many files at once would
+        # otherwise cost one main-loop wakeup per file.
+        with self._pending_fmd_lock:
+            schedule = not self._pending_fmd_updates
+            self._pending_fmd_updates.append(fmd)
+        if schedule:
+            GLib.idle_add(self._drain_fmd_updates)
+
+    def _drain_fmd_updates(self):
+        with self._pending_fmd_lock:
+            pending, self._pending_fmd_updates = self._pending_fmd_updates, []
+        for fmd in pending:
+            print(fmd)
+            if os.path.isfile(fmd.thumbnail_fn):
+                row = self._row_for(fmd.fn)
+                if row:
+                    row[4] = fmd.thumbnail_fn
+            if self.fn == fmd.fn and fmd.thumbnail_fn:
+                self.thumbnail_image.set_from_file(fmd.thumbnail_fn)
+                self.win.resize(1, 1)
+        if pending:
+            self.update_status()
+        return False
+
+    def set_playing_icon(self, fn):
+        # Only two rows can change: the one losing the icon and the one
+        # gaining it; leave every other row untouched.
+        if fn == self._icon_fn:
+            return
+        if self._icon_fn is not None:
+            row = self._row_for(self._icon_fn)
+            if row:
+                row[6] = None
+        if fn is not None:
+            row = self._row_for(fn)
+            if row:
+                row[6] = "video-x-generic"
+        self._icon_fn = fn
+
+    def _row_for(self, fn):
+        entry = self._queue_rows.get(fn)
+        if not entry:
+            return None
+        path = entry["ref"].get_path()
+        if path is None:
+            return None
+        return self.files_store[path]
+
     def queue_files(self, files):
-        existing_files = set([row[1] for row in self.files_store])
-        files = [f for f in files if f not in existing_files]
+        files = [f for f in files if f not in self._queue_rows]
         for fn in files:
             display = os.path.basename(fn)
             MAX_LEN = 40
             if len(display) > MAX_LEN:
                 display = display[: MAX_LEN - 10] + "..." + display[-10:]
 
-            def callback(fmd):
-                print(fmd)
-                if os.path.isfile(fmd.thumbnail_fn):
-                    for row in self.files_store:
-                        if row[1] == fmd.fn:
-                            row[4] = fmd.thumbnail_fn
-
-                def f():
-                    if self.fn == fmd.fn and fmd.thumbnail_fn:
-                        self.thumbnail_image.set_from_file(fmd.thumbnail_fn)
-                        self.win.resize(1, 1)
-                    self.update_status()
-
-                GLib.idle_add(f)
-
-            fmd = FileMetadata(fn, callback)
-            self.files_store.append(
+            fmd = FileMetadata(fn, self.on_fmd_ready)
+            iterx = self.files_store.append(
                 [display, fn, None, "...", None, None, None, None, fmd]
             )
-            start_thread(self.get_duration, args=[fn])
+            self._queue_rows[fn] = {
+                "ref": Gtk.TreeRowReference.new(
+                    self.files_store, self.files_store.get_path(iterx)
+                ),
+                "fmd": fmd,
+                "duration": None,
+                "transcoder": None,
+                "last_percent": None,
+            }
+            self.get_duration_async(fn)
         self.scrolled_window.set_visible(True)
         if len(files) and self.fn is None:
             self.select_file(files[0])
@@ -922,22 +1113,40 @@ class Gnomecast:
         self.cast.media_controller.stop()
 
     def get_logo_pixbuf(self, width=200, color=None):
-        svg = (Path(__file__) / ".." / "assets" / "gnomecast.svg").resolve().read_text()
-        if color:
-            svg = svg.replace("#aaaaaa", color)
-        f = Gio.MemoryInputStream.new_from_bytes(GLib.Bytes.new(svg.encode()))
-        preserve_aspect_ratio = True
-        pixbuf = GdkPixbuf.Pixbuf.new_from_stream(f, None)
-        return pixbuf
+        # Pixbufs are only handed to set_from_pixbuf/set_icon, so sharing
+        # the cached instance is safe.
+        return _render_logo(width, color)
 
     def quit(self, a=0, b=0):
+        transcoders = []
+        thumbnails = []
         for row in self.files_store:
-            transcoder = row[7]
-            if transcoder:
-                transcoder.destroy()
+            if row[7]:
+                transcoders.append(row[7])
             thumbnail_fn = row[4]
-            if thumbnail_fn and os.path.isfile(thumbnail_fn):
-                os.remove(thumbnail_fn)
+            # Cached thumbnails are kept for the next session; only remove
+            # the temp files left behind when the cache write failed.
+            if thumbnail_fn and not thumbnail_fn.startswith(PROBE_CACHE_DIR):
+                thumbnails.append(thumbnail_fn)
+        # Signal every ffmpeg before waiting on any of them, then reap with
+        # a short deadline each and clean up files in parallel.
+        for transcoder in transcoders:
+            transcoder.terminate_nowait()
+
+        def remove(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(remove, thumbnails))
+            for transcoder in transcoders:
+                transcoder.wait_or_kill(timeout=0.5)
+        if self._cast_browser:
+            self._cast_browser.stop_discovery()
+            self._cast_browser = None
+            self._zconf = None
         self.screen_saver_inhibitor.stop()
         Gtk.main_quit()
 
@@ -950,12 +1159,13 @@ class Gnomecast:
     def seek_delta(self, delta):
         seconds = (
             self.cast.media_controller.status.current_time
-            + time.time()
+            + time.monotonic()
             - self.last_time_current_time
             + delta
         )
-        self.last_time_current_time = time.time()
-        self.cast.media_controller.status.current_time = seconds
+        self.last_time_current_time = time.monotonic()
+        # Don't write back into pychromecast's status object; it refreshes
+        # itself from the seek() response.
         self.scrubber_adj.set_value(seconds)
         self.seeking = True
         self.cast.media_controller.seek(seconds)
@@ -967,7 +1177,9 @@ class Gnomecast:
         cast = self.cast
         mc = cast.media_controller
 
-        print("mc.status.player_state", mc.status.player_state, self.fn, hash(self.fn))
+        print(
+            "mc.status.player_state", mc.status.player_state, self.fn, self._fn_hash
+        )
         if (
             mc.status.player_state in ("IDLE", "UNKNOWN")
             or self.last_fn_played != self.fn
@@ -983,10 +1195,15 @@ class Gnomecast:
             current_time = self.scrubber_adj.get_value()
             if current_time:
                 kwargs["current_time"] = current_time
-            ext = self.fn.split(".")[-1]
-            ext = "".join(ch for ch in ext if ch.isalnum()).lower()
+            ext = os.path.splitext(self.fn)[1]
+            ext = _ALNUM_RE.sub("", ext).lower()
+            # The base URL never changes once the server is up, but the
+            # server starts in the background — resolve it on first play,
+            # not at selection time.
+            if self._media_url_base is None:
+                self._media_url_base = self.webserver.get_media_base_url()
             mc.play_media(
-                f"{self.webserver.get_media_base_url()}/{hash(self.fn)}.{ext}",
+                f"{self._media_url_base}/{self._fn_hash}.{ext}",
                 "audio/%s" % ext if ext in AUDIO_EXTS else "video/mp4",
                 **kwargs,
             )
@@ -999,29 +1216,34 @@ class Gnomecast:
             mc.play()
 
     def on_file_clicked(self, widget):
-        dialog = Gtk.FileChooserDialog(
-            "Please choose an audio or video file...",
-            self.win,
-            Gtk.FileChooserAction.OPEN,
-            (
-                Gtk.STOCK_CANCEL,
-                Gtk.ResponseType.CANCEL,
-                Gtk.STOCK_OPEN,
-                Gtk.ResponseType.OK,
-            ),
-        )
-        dialog.set_select_multiple(True)
+        # Building a FileChooserDialog is expensive; create it once and
+        # hide it between uses.
+        if self._file_dialog is None:
+            dialog = Gtk.FileChooserDialog(
+                "Please choose an audio or video file...",
+                self.win,
+                Gtk.FileChooserAction.OPEN,
+                (
+                    Gtk.STOCK_CANCEL,
+                    Gtk.ResponseType.CANCEL,
+                    Gtk.STOCK_OPEN,
+                    Gtk.ResponseType.OK,
+                ),
+            )
+            dialog.set_select_multiple(True)
 
-        downloads_dir = os.path.expanduser("~/Downloads")
-        if os.path.isdir(downloads_dir):
-            dialog.set_current_folder(downloads_dir)
+            downloads_dir = os.path.expanduser("~/Downloads")
+            if os.path.isdir(downloads_dir):
+                dialog.set_current_folder(downloads_dir)
 
-        filter_py = Gtk.FileFilter()
-        filter_py.set_name("Videos")
-        filter_py.add_mime_type("video/*")
-        filter_py.add_mime_type("audio/*")
-        dialog.add_filter(filter_py)
+            filter_py = Gtk.FileFilter()
+            filter_py.set_name("Videos")
+            filter_py.add_mime_type("video/*")
+            filter_py.add_mime_type("audio/*")
+            dialog.add_filter(filter_py)
+            self._file_dialog = dialog
 
+        dialog = self._file_dialog
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             print("Open clicked")
@@ -1031,30 +1253,33 @@ class Gnomecast:
         elif response == Gtk.ResponseType.CANCEL:
             print("Cancel clicked")
 
-        dialog.destroy()
+        dialog.hide()
 
     def on_new_subtitle_clicked(self):
-        dialog = Gtk.FileChooserDialog(
-            "Please choose a subtitle file...",
-            self.win,
-            Gtk.FileChooserAction.OPEN,
-            (
-                Gtk.STOCK_CANCEL,
-                Gtk.ResponseType.CANCEL,
-                Gtk.STOCK_OPEN,
-                Gtk.ResponseType.OK,
-            ),
-        )
+        if self._subtitle_dialog is None:
+            dialog = Gtk.FileChooserDialog(
+                "Please choose a subtitle file...",
+                self.win,
+                Gtk.FileChooserAction.OPEN,
+                (
+                    Gtk.STOCK_CANCEL,
+                    Gtk.ResponseType.CANCEL,
+                    Gtk.STOCK_OPEN,
+                    Gtk.ResponseType.OK,
+                ),
+            )
+
+            filter_py = Gtk.FileFilter()
+            filter_py.set_name("Subtitles")
+            filter_py.add_pattern("*.srt")
+            filter_py.add_pattern("*.vtt")
+            dialog.add_filter(filter_py)
+            self._subtitle_dialog = dialog
 
+        dialog = self._subtitle_dialog
         if self.fn:
             dialog.set_current_folder(os.path.dirname(self.fn))
 
-        filter_py = Gtk.FileFilter()
-        filter_py.set_name("Subtitles")
-        filter_py.add_pattern("*.srt")
-        filter_py.add_pattern("*.vtt")
-        dialog.add_filter(filter_py)
-
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             print("Open clicked")
@@ -1064,7 +1289,7 @@ class Gnomecast:
             print("Cancel clicked")
             self.subtitle_combo.set_active(0)
 
-        dialog.destroy()
+        dialog.hide()
 
     def select_subtitles_file(self, fn: str):
         substitles_path = Path(fn)
@@ -1076,18 +1301,34 @@ class Gnomecast:
 
         subtitles_path = substitles_path.resolve()
         display_name = subtitles_path.name
-        self.subtitles = convert_subtitles_to_webvtt(subtitles_path)
-        pos = len(self.subtitle_store)
-        stream = StreamMetadata(None, None, display_name)
-        stream._subtitles = self.subtitles
-        self.subtitle_store.append([display_name, stream, None])
-        self.subtitle_combo.set_active(pos)
+
+        def worker():
+            # The read plus the pycaption conversion can be slow (network
+            # filesystems, large SRTs); keep them off the GTK main loop.
+            subtitles = convert_subtitles_to_webvtt(subtitles_path)
+
+            def apply():
+                self.subtitles = subtitles
+                pos = len(self.subtitle_store)
+                stream = StreamMetadata(None, None, display_name)
+                stream._subtitles = subtitles
+                self.subtitle_store.append([display_name, stream, None])
+                self.subtitle_combo.set_active(pos)
+
+            GLib.idle_add(apply)
+
+        start_thread(worker)
 
     def unselect_file(self):
         self.thumbnail_image.set_from_pixbuf(self.get_logo_pixbuf())
         self.fn = None
-        self.stream_store.clear()
-        self.subtitle_store.clear()
+        self._fn_hash = None
+        # clear() emits row-deleted per row; don't fire the combo listeners
+        # when there is nothing to remove.
+        if len(self.stream_store):
+            self.stream_store.clear()
+        if len(self.subtitle_store):
+            self.subtitle_store.clear()
         self.subtitle_combo.set_active(0)
         self.transcoder = None
         self.duration = None
@@ -1096,23 +1337,27 @@ class Gnomecast:
 
         def f():
             self.scrubber_adj.set_value(0)
-            for row in self.files_store:
-                row[6] = None
+            self.set_playing_icon(None)
             self.win.resize(1, 1)
             self.update_button_visible()
 
         GLib.idle_add(f)
 
     def select_file(self, fn):
-        self.unselect_file()
         if not os.path.isfile(fn):
             show_error_dialog(
                 self.win, "File not found", f"Could not find media file: {fn}."
             )
             return
         fn = os.path.abspath(fn)
+        if fn == self.fn:
+            return
+        self.unselect_file()
         self.thumbnail_image.set_from_pixbuf(self.get_logo_pixbuf())
         self.fn = fn
+        # Cache the hash play_clicked needs so pressing play never has to
+        # recompute it.
+        self._fn_hash = hash(fn)
         self.stream_store.clear()
         self.subtitle_store.clear()
         if self.cast:
@@ -1120,16 +1365,14 @@ class Gnomecast:
 
         def f():
             self.scrubber_adj.set_value(0)
-            for row in self.files_store:
+            row = self._row_for(self.fn)
+            if row:
                 thumbnail_fn = row[4]
-                if self.fn == row[1]:
-                    if thumbnail_fn:
-                        self.thumbnail_image.set_from_file(thumbnail_fn)
-                        self.win.resize(1, 1)
-                    row[6] = "video-x-generic"
-                    self.duration = row[2]
-                else:
-                    row[6] = None
+                if thumbnail_fn:
+                    self.thumbnail_image.set_from_file(thumbnail_fn)
+                    self.win.resize(1, 1)
+                self.duration = row[2]
+            self.set_playing_icon(self.fn)
             start_thread(self.update_transcoders)
             start_thread(self.update_audio_tracks)
             start_thread(self.update_subtitles)
@@ -1143,10 +1386,8 @@ class Gnomecast:
     def update_transcoders(self):
         with self.update_transcoders_lock:
             if self.cast and self.fn:
-                transcoder = None
-                for row in self.files_store:
-                    if row[1] != self.fn:
-                        continue
+                row = self._row_for(self.fn)
+                if row:
                     transcoder = row[7]
                     fmd = row[8]
                     fmd.wait()
@@ -1172,6 +1413,7 @@ class Gnomecast:
                             transcoder,
                         )
                         row[7] = self.transcoder
+                        self._queue_rows[self.fn]["transcoder"] = self.transcoder
                 if self.autoplay:
                     self.autoplay = False
                     self.play_clicked(None)
@@ -1181,28 +1423,30 @@ class Gnomecast:
                     if transcoder:
                         transcoder.destroy()
                         row[7] = None
+                        self._queue_rows[row[1]]["transcoder"] = None
             GLib.idle_add(self.update_media_button_states)
 
     def check_for_next_in_queue(self):
-        next = False
-        for row in self.files_store:
-            fn = row[1]
-            if next:
-                print("check_for_next_in_queue", fn)
-                self.autoplay = True
-                self.select_file(fn)
-                next = False
-            if self.cast and self.fn and self.fn == fn:
-                next = True
+        if not (self.cast and self.fn):
+            return
+        fns = list(self._queue_rows)
+        try:
+            i = fns.index(self.fn)
+        except ValueError:
+            return
+        if i + 1 < len(fns):
+            next_fn = fns[i + 1]
+            print("check_for_next_in_queue", next_fn)
+            self.autoplay = True
+            self.select_file(next_fn)
 
     def prep_next_transcode(self):
         transcode_next = False
-        for row in self.files_store:
-            fn = row[1]
-            transcoder = row[7]
-            fmd = row[8]
+        for fn, entry in self._queue_rows.items():
+            transcoder = entry["transcoder"]
             if transcode_next and not transcoder:
                 print("prep_next_transcode", fn)
+                fmd = entry["fmd"]
                 transcoder = Transcoder(
                     self.cast,
                     fmd,
@@ -1214,7 +1458,10 @@ class Gnomecast:
                     self.error_callback,
                     transcoder,
                 )
-                row[7] = transcoder
+                entry["transcoder"] = transcoder
+                row = self._row_for(fn)
+                if row:
+                    row[7] = transcoder
                 transcode_next = False
             if (
                 self.cast
@@ -1225,22 +1472,45 @@ class Gnomecast:
             ):
                 transcode_next = True
 
-    def get_duration(self, fn: str) -> None:
-        duration = get_media_duration(fn)
+    def get_duration_async(self, fn: str) -> None:
+        # GIO runs the probe and delivers the result on the GTK main loop,
+        # so no thread (or idle_add hop) is needed per queued file.
+        try:
+            proc = Gio.Subprocess.new(
+                [
+                    "ffprobe",
+                    *("-v", "error"),
+                    *("-show_entries", "format=duration"),
+                    *("-of", "default=noprint_wrappers=1:nokey=1"),
+                    fn,
+                ],
+                Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_SILENCE,
+            )
+        except GLib.Error:
+            # ffprobe missing; check_ffmpeg already tells the user.
+            return
+        proc.communicate_utf8_async(None, None, self.on_duration_ready, fn)
+
+    def on_duration_ready(self, proc, result, fn: str) -> None:
+        try:
+            _, stdout, _ = proc.communicate_utf8_finish(result)
+            duration = float(stdout.strip())
+        except (GLib.Error, ValueError):
+            return
         if fn == self.fn:
             self.duration = duration
 
-        for row in self.files_store:
-            if row[1] == fn:
-                row[2] = duration
-                row[3] = humanize_seconds(duration)
+        row = self._row_for(fn)
+        if row:
+            row[2] = duration
+            row[3] = humanize_seconds(duration)
+        entry = self._queue_rows.get(fn)
+        if entry:
+            entry["duration"] = duration
 
     def get_fmd(self):
-        for row in self.files_store:
-            fn = row[1]
-            fmd = row[8]
-            if self.fn == fn:
-                return fmd
+        entry = self._queue_rows.get(self.fn)
+        return entry["fmd"] if entry else None
 
     def update_subtitles(self):
         fmd = self.get_fmd()
@@ -1255,28 +1525,46 @@ class Gnomecast:
             self.add_extra_subtitle_options()
 
         GLib.idle_add(f)
-        ext = self.fn.split(".")[-1]
-        sexts = ["vtt", "srt"]
-        for sext in sexts:
-            if os.path.isfile(self.fn[: -len(ext)] + sext):
-                self.select_subtitles_file(self.fn[: -len(ext)] + sext)
-                break
+        # One directory scan finds any sibling subtitle file; preferring
+        # .vtt here makes the pick deterministic when both exist.
+        parent, base = os.path.split(self.fn)
+        stem = os.path.splitext(base)[0]
+        ranks = {stem + ".vtt": 0, stem + ".srt": 1}
+        found = None
+        try:
+            with os.scandir(parent or ".") as entries:
+                for dir_entry in entries:
+                    rank = ranks.get(dir_entry.name)
+                    if rank is None or not dir_entry.is_file():
+                        continue
+                    if found is None or rank < found[0]:
+                        found = (rank, dir_entry.path)
+                    if rank == 0:
+                        break
+        except OSError:
+            return
+        if found:
+            self.select_subtitles_file(found[1])
 
     def update_audio_tracks(self):
         fmd = self.get_fmd()
         fmd.wait()
 
+        # Pre-format the row titles here so the idle handler only appends.
+        rows = [
+            (
+                "%s - %s" % (video_stream.title, audio_stream.title),
+                video_stream,
+                audio_stream,
+            )
+            for video_stream in fmd.video_streams
+            for audio_stream in fmd.audio_streams
+        ]
+
         def f():
             self.stream_store.clear()
-            for video_stream in fmd.video_streams:
-                for audio_stream in fmd.audio_streams:
-                    self.stream_store.append(
-                        [
-                            "%s - %s" % (video_stream.title, audio_stream.title),
-                            video_stream,
-                            audio_stream,
-                        ]
-                    )
+            for row in rows:
+                self.stream_store.append(row)
             self.audio_combo.set_active(0)
 
         GLib.idle_add(f)
@@ -1436,6 +1724,9 @@ class Gnomecast:
             cast, name = model[tree_iter][:2]
             if cast == -1:
                 self.get_nonlocal_cast()
+            elif isinstance(cast, pychromecast.models.CastInfo):
+                # Discovery only hands us CastInfo; connect off the main loop.
+                start_thread(self.connect_to_cast, args=[cast])
             else:
                 print(cast)
                 self.select_cast(cast)
@@ -1462,8 +1753,9 @@ class Gnomecast:
 
                     def f():
                         self.play_clicked(None)
+                        return False
 
-                    start_thread(GLib.iddle_add, args=(f,), delay=1)
+                    GLib.timeout_add_seconds(1, f)
         else:
             entry = combo.get_child()
 
@@ -1510,28 +1802,46 @@ python gnomecast.py [<media_filename>] [-d|--device <chromecast_name>] [-s|--sub
 """.strip()
 
 
+_TRANSCODE_RE = re.compile(r"^gnomecast_pid(\d+)_")
+
+
 def delete_old_transcodes():
     # if process is killed old transcoded files can be left around
     # delete if found
+    by_pid = {}
+    old_style = []
     for tmpdir in ["/tmp", "/var/tmp"]:
-        for fn in os.listdir(tmpdir):
-            if not fn.startswith("gnomecast_"):
-                continue
-            if fn.startswith("gnomecast_transcode_cache"):
-                continue
-            fn = os.path.join(tmpdir, fn)
-            match = re.search(r"gnomecast_pid(\d+)_", fn)
-            if match:
-                pid = int(match.group(1))
-                if not is_pid_running(pid):
-                    print("\tpid", pid, "is dead, so deleting", fn)
-                    os.remove(fn)
-            else:
-                print("old style gnomecast file", fn, "found, so deleting...")
-                os.remove(fn)
+        try:
+            entries = os.scandir(tmpdir)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if not name.startswith("gnomecast_"):
+                    continue
+                if name.startswith("gnomecast_transcode_cache"):
+                    continue
+                match = _TRANSCODE_RE.match(name)
+                if match:
+                    pid = int(match.group(1))
+                    by_pid.setdefault(pid, []).append(entry.path)
+                else:
+                    old_style.append(entry.path)
+    # One liveness probe per pid, however many files it left behind.
+    for pid, paths in by_pid.items():
+        if is_pid_running(pid):
+            continue
+        for path in paths:
+            print("\tpid", pid, "is dead, so deleting", path)
+            os.remove(path)
+    for path in old_style:
+        print("old style gnomecast file", path, "found, so deleting...")
+        os.remove(path)
 
 
 def main():
     delete_old_transcodes()
+    prune_probe_cache()
     caster = Gnomecast()
     arg_parse(sys.argv[1:], {"s": "subtitles", "d": "device"}, caster.run, USAGE)
@@ -1,20 +1,62 @@
+import mmap
+import re
 import subprocess
 from pathlib import Path
 import tempfile
 import pycaption
 
+_WEBVTT_HEAD_RE = re.compile(r"^\s*WEBVTT")
+_SRT_HEAD_RE = re.compile(r"^\s*\d+\s*\r?\n\s*\d{2}:\d{2}:\d{2}[,.]\d{3}\s*-->")
+
+
+def _detect_format(subtitles: str):
+    """
+    Detect the caption format from its leading signature. pycaption's
+    detect_format tries every reader against the whole text; the cheap
+    head checks cover the formats users actually feed us, and anything
+    else falls through to the full detection.
+    """
+    head = subtitles[:512]
+    if _WEBVTT_HEAD_RE.match(head):
+        return pycaption.WebVTTReader
+    if _SRT_HEAD_RE.match(head):
+        return pycaption.SRTReader
+    return pycaption.detect_format(subtitles)
+
 
 def convert_subtitles_to_webvtt(subtitles_path: Path) -> str:
-    subtitles_bytes = Path(subtitles_path).read_bytes()
+    with open(subtitles_path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped (and carry no captions anyway).
+            return ""
+        try:
+            header = bytes(mm[:16]).lstrip(b"\xef\xbb\xbf")
+            already_webvtt = header.startswith(b"WEBVTT")
+            subtitles_bytes = mm[:]
+        finally:
+            mm.close()
+
     try:
         subtitles = subtitles_bytes.decode("utf-8")
     except UnicodeDecodeError:
+        # latin-1 maps every byte, so this fallback cannot itself fail.
         subtitles = subtitles_bytes.decode("latin-1")
 
-    subtitles.removeprefix("\ufeff")  # Remove BOM if present
+    subtitles = subtitles.removeprefix("\ufeff")  # Remove BOM if present
+
+    if already_webvtt:
+        # The header already identifies the format; don't run pycaption.
+        return subtitles
+
+    reader = _detect_format(subtitles)
+    if reader is pycaption.WebVTTReader:
+        # Already WebVTT; skip the parse + re-serialize round trip.
+        return subtitles
 
     converter = pycaption.CaptionConverter()
-    converter.read(subtitles, pycaption.detect_format(subtitles)())
+    converter.read(subtitles, reader())
     return converter.write(pycaption.WebVTTWriter())
 
 
@@ -54,11 +96,11 @@ def extract_subtitles_from_file(
     ]
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_dir = Path(temp_dir)
-        output_files = []
-        for i, index in enumerate(indexes):
-            output_file = temp_dir / f"subtitle_{i:03d}.vtt"
+        output_files = [
+            temp_dir / f"subtitle_{i:03d}.vtt" for i in range(len(indexes))
+        ]
+        for index, output_file in zip(indexes, output_files):
             cmd += ["-map", index, "-f", "webvtt", "-scodec", "webvtt", output_file]
-            output_files.append(output_file)
 
         try:
             subprocess.run(cmd, check=True)
@@ -66,7 +108,4 @@ def extract_subtitles_from_file(
             print(f"Error extracting subtitles: {e.stderr.strip()}")
             return None
 
-        result = []
-        for output_file in output_files:
-            result.append(output_file.read_text())
-    return result
+        return [output_file.read_text() for output_file in output_files]
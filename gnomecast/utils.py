@@ -1,21 +1,34 @@
+import functools
 import os
 import socket
 import threading
+import time
 from collections.abc import Callable, Iterable
 
 
+@functools.lru_cache(maxsize=1)
 def get_webserver_ip_address() -> str:
-    hostname = socket.gethostname()
-    _, _, ip_addresses = socket.gethostbyname_ex(hostname)
-    for ip in ip_addresses:
-        if not ip.startswith("127."):
-            return ip
+    # Connecting a UDP socket resolves the outbound interface address
+    # without any DNS traffic; no packet is actually sent.
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("1.1.1.1", 53))
+            ip, _ = s.getsockname()
+        return ip
+    except OSError:
+        pass
 
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-        s.connect(("1.1.1.1", 53))
-        ip, _ = s.getsockname()
-    # TODO: handle OSError (network unreachable) and return explicit message
-    return ip
+    # Network unreachable; fall back to the hostname lookup, which may
+    # block on DNS but can still find a usable address.
+    try:
+        hostname = socket.gethostname()
+        _, _, ip_addresses = socket.gethostbyname_ex(hostname)
+        for ip in ip_addresses:
+            if not ip.startswith("127."):
+                return ip
+    except OSError:
+        pass
+    return "127.0.0.1"
 
 
 def get_webserver_port() -> int:
@@ -28,22 +41,52 @@ def get_webserver_port() -> int:
         return port
 
 
+def get_webserver_threads() -> int:
+    try:
+        return int(os.environ["GNOMECAST_HTTP_THREADS"])
+    except (KeyError, ValueError, TypeError):
+        return 16
+
+
 def throttle(seconds: float) -> Callable[[Callable], Callable]:
+    """
+    Run the decorated function at most once per `seconds`: the first call
+    in a window runs immediately, and the latest call made during the
+    window runs once when it closes.
+    """
+
     def decorator(f: Callable) -> Callable:
-        timer = None
+        lock = threading.Lock()
+        last_run = float("-inf")
+        timer: threading.Timer | None = None
         latest_args, latest_kwargs = (), {}
 
-        def run_f():
-            nonlocal timer, latest_args, latest_kwargs
-            f(*latest_args, **latest_kwargs)
-            timer = None
+        def run_trailing():
+            nonlocal timer, last_run
+            with lock:
+                timer = None
+                last_run = time.monotonic()
+                args, kwargs = latest_args, latest_kwargs
+            f(*args, **kwargs)
 
         def wrapper(*args, **kwargs) -> None:
-            nonlocal timer, latest_args, latest_kwargs
-            latest_args, latest_kwargs = args, kwargs
-            if timer is None:
-                timer = threading.Timer(seconds, run_f)
-                timer.start()
+            nonlocal timer, last_run, latest_args, latest_kwargs
+            run_now = False
+            with lock:
+                now = time.monotonic()
+                if now - last_run >= seconds:
+                    last_run = now
+                    run_now = True
+                else:
+                    latest_args, latest_kwargs = args, kwargs
+                    if timer is None:
+                        timer = threading.Timer(
+                            seconds - (now - last_run), run_trailing
+                        )
+                        timer.daemon = True
+                        timer.start()
+            if run_now:
+                f(*args, **kwargs)
 
         return wrapper
 
@@ -69,19 +112,11 @@ def start_thread(
     *,
     args: Iterable | None = None,
     kwargs: dict | None = None,
-    delay: float | None = None,
     daemon: bool = False,
 ) -> None:
-    args = args or ()
-    kwargs = kwargs or {}
-    if delay:
-        if daemon:
-            raise ValueError("Cannot use delay with daemon threads")
-        thread = threading.Timer(delay, target, args=args, kwargs=kwargs)
-    else:
-        thread = threading.Thread(
-            target=target, args=args, kwargs=kwargs, daemon=daemon
-        )
+    thread = threading.Thread(
+        target=target, args=args or (), kwargs=kwargs or {}, daemon=daemon
+    )
     thread.start()
 
 
@@ -1,58 +1,249 @@
+import collections
+import hashlib
+import logging
+import logging.handlers
+import mimetypes
+import os
+import queue
+import re
+import socket
+import threading
+
 import bottle
 from paste import httpserver
 from paste.translogger import TransLogger
 
-from gnomecast.utils import get_webserver_ip_address, get_webserver_port
+from gnomecast.utils import (
+    get_webserver_ip_address,
+    get_webserver_port,
+    get_webserver_threads,
+)
+
+_CHUNK_SIZE = 256 * 1024
+
+# Ranges up to this size are answered with a single pread; anything
+# bigger streams in _CHUNK_SIZE pieces.
+_SMALL_RANGE_LIMIT = 1024 * 1024
+
+# Byte budget for the LRU of recently served small ranges.
+_RANGE_CACHE_BUDGET = 32 * 1024 * 1024
+
+# Chromecast only ever sends a single "bytes=start-[end]" range.
+_RANGE_RE = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_range(fd, offset, nbytes):
+    # The descriptor is shared between requests; don't close it here.
+    while nbytes > 0:
+        chunk = os.pread(fd, min(_CHUNK_SIZE, nbytes), offset)
+        if not chunk:
+            break
+        offset += len(chunk)
+        nbytes -= len(chunk)
+        yield chunk
 
 
 class GnomecastWebServer:
-    def __init__(self, get_subtitles, get_transcoder):
+    def __init__(self, get_subtitles, get_transcoder, access_log=None):
         self.ip = get_webserver_ip_address()
         self.port = get_webserver_port()
         self.get_subtitles = get_subtitles
         self.get_transcoder = get_transcoder
+        # ip and port never change after construction; format the URLs once.
+        self._subtitles_url = f"http://{self.ip}:{self.port}/subtitles.vtt"
+        self._media_base_url = f"http://{self.ip}:{self.port}/media/"
         self.app = bottle.Bottle()
+        self._cors_headers = (
+            ("Access-Control-Allow-Origin", "*"),
+            ("Access-Control-Allow-Methods", "GET, HEAD"),
+            ("Access-Control-Allow-Headers", "Content-Type"),
+        )
+        # (source str, payload bytes, etag) for the current subtitles.
+        self._subtitles_cache = (None, b"", None)
+        self._fd = None
+        self._fd_path = None
+        self._fd_lock = threading.Lock()
+        self._range_cache = collections.OrderedDict()
+        self._range_cache_size = 0
+        self._range_cache_lock = threading.Lock()
+        self._started = False
         self._setup_routes()
+        self._handler = self._build_handler(access_log)
+
+    def _build_handler(self, access_log):
+        if access_log is None:
+            access_log = bool(os.environ.get("GNOMECAST_ACCESS_LOG"))
+        if not access_log:
+            return self.app
+        # Access logging writes through a queue so the serving thread only
+        # pays for an enqueue; a background listener does the stderr I/O.
+        log_queue = queue.SimpleQueue()
+        access_logger = logging.getLogger("gnomecast.access")
+        access_logger.setLevel(logging.INFO)
+        access_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        access_logger.propagate = False
+        listener = logging.handlers.QueueListener(
+            log_queue, logging.StreamHandler()
+        )
+        listener.start()
+        return TransLogger(
+            self.app, logger=access_logger, setup_console_handler=False
+        )
+
+    def _media_fd(self, path):
+        # One descriptor serves the whole session; pread keeps it free of
+        # seek state, so threads can share it. The path alone can't tell
+        # us when to reopen: every finished transcode is renamed onto the
+        # same transcode-cache path, so a new file can appear under the
+        # path we already have open. Compare inodes and reopen whenever
+        # the descriptor no longer points at the file the path names.
+        with self._fd_lock:
+            if self._fd is not None:
+                try:
+                    fd_stat = os.fstat(self._fd)
+                    path_stat = os.stat(path)
+                    current = (
+                        self._fd_path == path
+                        and fd_stat.st_dev == path_stat.st_dev
+                        and fd_stat.st_ino == path_stat.st_ino
+                    )
+                except OSError:
+                    current = False
+                if not current:
+                    os.close(self._fd)
+                    self._fd = None
+                    self._fd_path = None
+            if self._fd is None:
+                self._fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+                self._fd_path = path
+            return self._fd
+
+    def _subtitles_payload(self):
+        source = self.get_subtitles() or ""
+        cached_source, payload, etag = self._subtitles_cache
+        if source is not cached_source:
+            payload = source.encode("utf-8")
+            etag = '"%s"' % hashlib.sha1(payload).hexdigest()
+            self._subtitles_cache = (source, payload, etag)
+        return payload, etag
 
     def get_subtitles_url(self) -> str:
-        return f"http://{self.ip}:{self.port}/subtitles.vtt"
+        return self._subtitles_url
 
     def get_media_base_url(self) -> str:
-        return f"http://{self.ip}:{self.port}/media/"
+        return self._media_base_url
+
+    def _range_not_satisfiable(self, size=None):
+        # A clean 416 stops the player from retrying a request that can
+        # never succeed; a 500 would just amplify the load.
+        response = bottle.response
+        response.status = 416
+        for name, value in self._cors_headers:
+            response.headers[name] = value
+        response.headers["Accept-Ranges"] = "bytes"
+        if size is not None:
+            response.headers["Content-Range"] = f"bytes */{size}"
+        return b""
 
     def _setup_routes(self) -> None:
         app = self.app
 
         @app.route("/subtitles.vtt")
         def subtitles():
+            payload, etag = self._subtitles_payload()
             response = bottle.response
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = "GET, HEAD"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+            for name, value in self._cors_headers:
+                response.headers[name] = value
+            response.headers["ETag"] = etag
+            # The player re-requests the track periodically; a matching
+            # ETag means it already has these bytes.
+            if bottle.request.environ.get("HTTP_IF_NONE_MATCH") == etag:
+                response.status = 304
+                return b""
             response.headers["Content-Type"] = "text/vtt"
-            return self.get_subtitles()
+            return payload
 
         @app.get("/media/<id>.<ext>")
         def video(id, ext):
-            print(list(bottle.request.headers.items()))
-            ranges = list(
-                bottle.parse_range_header(
-                    bottle.request.environ["HTTP_RANGE"], 1000000000000
-                )
-            )
-            print("ranges", ranges)
-            offset, end = ranges[0]
+            header = bottle.request.environ.get("HTTP_RANGE", "")
+            match = _RANGE_RE.match(header)
+            if match is None:
+                logger.debug("unusable range header: %r", header)
+                return self._range_not_satisfiable()
+            logger.debug("range request: %s", header)
+            offset = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else None
             transcoder = self.get_transcoder()
             transcoder.wait_for_byte(offset)
-            response = bottle.static_file(transcoder.fn, root="/")
-            response.headers.pop("Last-Modified", None)
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = "GET, HEAD"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type"
-            return response
+            fd = self._media_fd(transcoder.fn)
+            stat = os.fstat(fd)
+            size = stat.st_size
+            if offset >= size:
+                return self._range_not_satisfiable(size)
+            end = size if end is None else min(end, size)
+            length = end - offset
+            response = bottle.response
+            response.status = 206
+            response.headers["Content-Type"] = (
+                mimetypes.guess_type(transcoder.fn)[0] or "application/octet-stream"
+            )
+            response.headers["Content-Range"] = f"bytes {offset}-{end - 1}/{size}"
+            response.headers["Content-Length"] = str(length)
+            response.headers["Accept-Ranges"] = "bytes"
+            for name, value in self._cors_headers:
+                response.headers[name] = value
+            # Seek-time probe ranges are tiny; answer those with a single
+            # pread instead of paying the iterator machinery. Big ranges
+            # stream so the server starts writing immediately.
+            if length <= _SMALL_RANGE_LIMIT:
+                # Seeks re-request the same header/index ranges over and
+                # over; keep the small, fully-written ones in an LRU.
+                cacheable = length <= _CHUNK_SIZE and (
+                    transcoder.done or end <= transcoder.progress_bytes
+                )
+                # Key by inode, not path: successive transcodes are renamed
+                # onto the same transcode-cache path.
+                key = (stat.st_dev, stat.st_ino, offset, length)
+                if cacheable:
+                    with self._range_cache_lock:
+                        data = self._range_cache.get(key)
+                        if data is not None:
+                            self._range_cache.move_to_end(key)
+                            return data
+                data = os.pread(fd, length, offset)
+                if cacheable:
+                    with self._range_cache_lock:
+                        self._range_cache[key] = data
+                        self._range_cache_size += len(data)
+                        while self._range_cache_size > _RANGE_CACHE_BUDGET:
+                            _, evicted = self._range_cache.popitem(last=False)
+                            self._range_cache_size -= len(evicted)
+                return data
+            return _iter_range(fd, offset, length)
 
     def start(self) -> None:
-        handler = TransLogger(self.app, setup_console_handler=True)
-        httpserver.serve(
-            handler, host=self.ip, port=str(self.port), daemon_threads=True
+        # serve() blocks forever; a second call would try to bind the same
+        # port and spin up a second worker pool.
+        if self._started:
+            return
+        self._started = True
+        # A fixed worker pool instead of a thread per connection: range
+        # requests are long-lived, and spawning threads per request falls
+        # over with a couple dozen concurrent clients.
+        # daemon_threads also marks the pool workers as daemons; without it
+        # they block in queue.get() forever and the process can't exit.
+        server = httpserver.serve(
+            self._handler,
+            host=self.ip,
+            port=str(self.port),
+            use_threadpool=True,
+            threadpool_workers=get_webserver_threads(),
+            daemon_threads=True,
+            start_loop=False,
         )
+        # A roomy send buffer lets the kernel drain each 256 KiB chunk in
+        # few write() calls instead of fragmenting it.
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        server.serve_forever()